@@ -1,22 +1,60 @@
 import argparse
 import asyncio
 import base64
+import contextlib
 import json
 import os
+import socket
 import struct
 import sys
 import urllib.request
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Final, Iterable, List, Optional
+
+try:
+    import orjson
+except ImportError:  # Optional; fall back to the stdlib json module
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # Optional; fall back to the default asyncio event loop
+    uvloop = None
+
+try:
+    import ijson
+except ImportError:  # Optional; fall back to parsing the whole store catalog
+    ijson = None
+
+try:
+    # Tornado's C masking routine (64-bit XOR blocks), if it is installed
+    from tornado.speedups import websocket_mask as _websocket_mask
+except ImportError:  # Optional; fall back to the pure-Python masking below
+    _websocket_mask = None
+
+# JSON codecs resolved once at import; both work in bytes
+if orjson is not None:
+    _DUMPS = orjson.dumps
+    _LOADS = orjson.loads
+else:
+    def _DUMPS(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+    # json.loads accepts UTF-8 bytes directly, skipping a str copy
+    _LOADS = json.loads
 
 # Decky Loader Message Types
-CALL = 0
-REPLY = 1
-ERROR = -1
-EVENT = 3
+CALL: Final[int] = 0
+REPLY: Final[int] = 1
+ERROR: Final[int] = -1
+EVENT: Final[int] = 3
 
 # Default store URL
 DEFAULT_STORE_URL = "https://plugins.deckbrew.xyz/plugins"
 
+# HTTP timeouts in seconds (applied per socket operation by urllib)
+_TOKEN_TIMEOUT = 5
+_STORE_TIMEOUT = 10
+
 # Store type mapping
 STORE_TYPE_NAMES = {
     0: "default",
@@ -30,6 +68,77 @@ def log(*args: Any) -> None:
     print("[DeckyInstaller]", *args, file=sys.stderr, flush=True)
 
 
+# Payloads at or above this size are masked via bytes.translate
+_TRANSLATE_MASK_THRESHOLD = 65536
+
+# Larger outgoing payloads are masked, written and drained in slices of this
+# size; it must stay a multiple of 4 so every slice starts at mask offset 0
+_WRITE_CHUNK_SIZE = 65536
+
+
+def _http_get(url: str, timeout: float) -> bytes:
+    """Blocking HTTP GET returning the response body; run via asyncio.to_thread."""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+def _find_plugin(plugins: Iterable[Dict[str, Any]],
+                 target_id: int) -> Optional[Dict[str, Any]]:
+    """Return the first store entry whose id matches target_id."""
+    # Compare raw ids instead of int()-parsing every entry; the store may
+    # serialize ids as numbers or strings.
+    target_key = str(target_id)
+    return next((p for p in plugins
+                 if p.get("id") == target_id or p.get("id") == target_key), None)
+
+
+def _fetch_store_plugin(store_url: str, target_id: int,
+                        timeout: float) -> Optional[Dict[str, Any]]:
+    """Blocking lookup of one plugin in the store catalog; run via asyncio.to_thread."""
+    with urllib.request.urlopen(store_url, timeout=timeout) as response:
+        if ijson is not None:
+            # Stream-parse the catalog and stop at the first match
+            return _find_plugin(ijson.items(response, "item"), target_id)
+        plugins = _LOADS(response.read())
+    return _find_plugin(plugins, target_id)
+
+
+def _frame_header(first_byte: int, length: int, mask: bytes) -> bytes:
+    """Build a masked client frame header for a payload of the given length."""
+    if length < 126:
+        return struct.pack("!BB4s", first_byte, length | 0x80, mask)
+    if length < 65536:
+        return struct.pack("!BBH4s", first_byte, 126 | 0x80, length, mask)
+    return struct.pack("!BBQ4s", first_byte, 127 | 0x80, length, mask)
+
+
+def _mask_translate(payload: bytes, mask: bytes) -> bytes:
+    """Apply a 4-byte WebSocket mask using one translate() pass per mask byte."""
+    out = bytearray(len(payload))
+    for k, m in enumerate(mask):
+        table = bytes(b ^ m for b in range(256))
+        out[k::4] = payload[k::4].translate(table)
+    return bytes(out)
+
+
+def _mask_int(payload: bytes, mask: bytes) -> bytes:
+    """Apply a 4-byte WebSocket mask using a single big-int XOR."""
+    length = len(payload)
+    mask_repeated = (mask * ((length + 3) // 4))[:length]
+    masked = int.from_bytes(payload, "big") ^ int.from_bytes(mask_repeated, "big")
+    return masked.to_bytes(length, "big")
+
+
+def _mask(payload: bytes, mask: bytes) -> bytes:
+    """Apply a 4-byte WebSocket mask to payload."""
+    if _websocket_mask is not None:
+        return _websocket_mask(mask, payload)
+    if len(payload) >= _TRANSLATE_MASK_THRESHOLD:
+        # Building the tables costs more than the big-int XOR on small frames
+        return _mask_translate(payload, mask)
+    return _mask_int(payload, mask)
+
+
 class DeckyClient:
     """
     A robust client for Decky Loader using asyncio streams.
@@ -45,14 +154,25 @@ class DeckyClient:
     async def get_token(self) -> str:
         """Fetch the CSRF token via HTTP GET."""
         url = f"http://{self.host}:{self.port}/auth/token"
-        # Using a context manager for the request
-        with urllib.request.urlopen(url, timeout=5) as response:
-            return response.read().decode().strip()
+        # urllib is blocking, so keep it off the event loop
+        token = await asyncio.to_thread(_http_get, url, _TOKEN_TIMEOUT)
+        return token.decode().strip()
 
+    async def open(self) -> None:
+        """Fetch a token and connect, unless already connected."""
+        if self.writer is not None:
+            return
+        log(f"Connecting to Decky server at {self.host}:{self.port}...")
+        token = await self.get_token()
+        await self.connect(token)
 
     async def connect(self, token: str) -> None:
         """Connect and perform WebSocket handshake."""
         self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        # Small request/reply frames; don't let Nagle hold them back
+        sock = self.writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
         # Build handshake
         key = base64.b64encode(os.urandom(16)).decode()
@@ -68,12 +188,15 @@ class DeckyClient:
         await self.writer.drain()
 
         # Read response headers (terminated by \r\n\r\n)
-        header_data = b""
-        while b"\r\n\r\n" not in header_data:
-            chunk = await self.reader.read(1024)
-            if not chunk:
-                raise ConnectionError("Server closed connection during handshake")
-            header_data += chunk
+        try:
+            header_data = await asyncio.wait_for(
+                self.reader.readuntil(b"\r\n\r\n"), timeout=5)
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("Server closed connection during handshake") from None
+        except asyncio.TimeoutError:
+            raise ConnectionError("Timed out waiting for handshake response") from None
+        except asyncio.LimitOverrunError:
+            raise ConnectionError("Handshake response headers too large") from None
 
         if b"101 Switching Protocols" not in header_data:
             raise RuntimeError(f"Handshake failed: {header_data.decode(errors='ignore')}")
@@ -91,29 +214,38 @@ class DeckyClient:
             "route": method,
             "args": args,
         }
-        payload = json.dumps(message_dict).encode()
+        payload = _DUMPS(message_dict)
         length = len(payload)
 
-        # Header: FIN=1, Opcode=1 (Text)
-        frame = bytearray([0x81])
-
-        if length < 126:
-            frame.append(length | 0x80)
-        elif length < 65536:
-            frame.append(126 | 0x80)
-            frame.extend(struct.pack("!H", length))
-        else:
-            frame.append(127 | 0x80)
-            frame.extend(struct.pack("!Q", length))
-
         # Client must mask data
         mask = os.urandom(4)
-        frame.extend(mask)
-        masked_payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
-        frame.extend(masked_payload)
 
-        self.writer.write(frame)
-        await self.writer.drain()
+        if length < 126:
+            self._send_short(payload, mask)
+            await self.writer.drain()
+            return
+
+        # Header: FIN=1, Opcode=1 (Text)
+        header = _frame_header(0x81, length, mask)
+        if length <= _WRITE_CHUNK_SIZE:
+            self.writer.writelines([header, _mask(payload, mask)])
+            await self.writer.drain()
+        else:
+            self.writer.write(header)
+            # Mask one slice at a time and drain after each, so the transport
+            # buffers roughly one masked slice rather than a full masked copy
+            for offset in range(0, length, _WRITE_CHUNK_SIZE):
+                chunk = payload[offset:offset + _WRITE_CHUNK_SIZE]
+                self.writer.write(_mask(chunk, mask))
+                await self.writer.drain()
+
+    def _send_short(self, payload: bytes, mask: bytes) -> None:
+        """Write a text frame whose payload fits the 7-bit length field."""
+        # Most RPC calls take this path. The length is already known to fit, so
+        # use the fixed 7-bit header format and mask with the big-int XOR
+        # directly instead of going through _frame_header() and _mask().
+        header = struct.pack("!BB4s", 0x81, len(payload) | 0x80, mask)
+        self.writer.writelines([header, _mask_int(payload, mask)])
 
     async def recv(self) -> Optional[Dict[str, Any]]:
         """Receive and parse one WebSocket text frame."""
@@ -138,28 +270,17 @@ class DeckyClient:
                 payload_raw = await self.reader.readexactly(length)
 
                 if has_mask:
-                    payload_raw = bytes(b ^ mask[i % 4] for i, b in enumerate(payload_raw))
+                    payload_raw = _mask(payload_raw, mask)
 
                 # Handle control and non-text frames
                 if opcode == 0x8:  # Close
                     return None
                 if opcode == 0x9:  # Ping -> Pong
                     if self.writer:
-                        pong = bytearray([0x8A])
-                        pong_len = len(payload_raw)
-                        if pong_len < 126:
-                            pong.append(pong_len | 0x80)
-                        elif pong_len < 65536:
-                            pong.append(126 | 0x80)
-                            pong.extend(struct.pack("!H", pong_len))
-                        else:
-                            pong.append(127 | 0x80)
-                            pong.extend(struct.pack("!Q", pong_len))
                         mask = os.urandom(4)
-                        pong.extend(mask)
-                        masked_payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload_raw))
-                        pong.extend(masked_payload)
-                        self.writer.write(pong)
+                        header = _frame_header(0x8A, len(payload_raw), mask)
+                        masked_payload = _mask(payload_raw, mask)
+                        self.writer.writelines([header, masked_payload])
                         await self.writer.drain()
                     continue
                 if opcode == 0xA:  # Pong
@@ -167,7 +288,7 @@ class DeckyClient:
                 if opcode != 0x1:  # Not a text frame
                     continue
 
-                return json.loads(payload_raw.decode())
+                return _LOADS(payload_raw)
         except (asyncio.IncompleteReadError, ConnectionError):
             return None
 
@@ -178,36 +299,47 @@ class DeckyClient:
         try:
             # FIN=1, opcode=8 (Close), masked payload with status 1000
             payload = struct.pack("!H", 1000)
-            frame = bytearray([0x88, 0x80 | len(payload)])
             mask = os.urandom(4)
-            frame.extend(mask)
-            masked_payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
-            frame.extend(masked_payload)
-            self.writer.write(frame)
+            header = _frame_header(0x88, len(payload), mask)
+            masked_payload = _mask(payload, mask)
+            self.writer.writelines([header, masked_payload])
             await self.writer.drain()
         except Exception:
             pass
         finally:
-            self.writer.close()
-            await self.writer.wait_closed()
+            writer = self.writer
+            # Forget the streams so open() reconnects if this client is reused
+            self.reader = None
+            self.writer = None
+            writer.close()
+            await writer.wait_closed()
 
 
-async def run_installer(target_id: int, store_url: str) -> None:
+async def run_installer(target_id: int, store_url: str,
+                        client: Optional[DeckyClient] = None) -> None:
     """Installation workflow."""
-    client = DeckyClient()
+    own_client = client is None
+    if own_client:
+        client = DeckyClient()
     success = False
     confirmed = False
     error: Optional[BaseException] = None
+    target_id = int(target_id)
+    store_task: Optional[asyncio.Task] = None
     try:
-        log(f"Contacting Mock Server at {client.host}:{client.port}...")
-        token = await client.get_token()
-        await client.connect(token)
+        token = None
+        if client.writer is None:
+            log(f"Connecting to Decky server at {client.host}:{client.port}...")
+            token = await client.get_token()
+        # Start the catalog download once Decky has answered, so it overlaps the
+        # handshake without holding back the error when Decky is not running
+        store_task = asyncio.create_task(
+            asyncio.to_thread(_fetch_store_plugin, store_url, target_id, _STORE_TIMEOUT))
+        if token is not None:
+            await client.connect(token)
 
         log(f"Connection established. Fetching plugin metadata for ID: {target_id}")
-        with urllib.request.urlopen(store_url, timeout=10) as response:
-            store_raw = response.read().decode()
-        plugins = json.loads(store_raw)
-        target = next((p for p in plugins if int(p.get("id")) == int(target_id)), None)
+        target = await store_task
         if not target:
             raise RuntimeError(f"plugin id {target_id} not found")
 
@@ -216,7 +348,9 @@ async def run_installer(target_id: int, store_url: str) -> None:
         if not versions:
             raise RuntimeError("store entry missing versions")
 
-        latest = sorted(versions, key=lambda v: (v.get("name") or ""))[-1]
+        # max() keeps the first of equal keys; scan in reverse so ties resolve to
+        # the last entry, as the previous sorted(...)[-1] did
+        latest = max(reversed(versions), key=lambda v: v.get("name") or "")
         version_name = latest.get("name") or "dev"
         artifact_url = latest.get("artifact") or ""
         hash_ = latest.get("hash") or ""
@@ -240,9 +374,10 @@ async def run_installer(target_id: int, store_url: str) -> None:
                 break
 
             m_type = msg.get("type")
+            event = msg.get("event") if m_type == EVENT else None
+            m_args = msg.get("args") or []
 
-            if m_type == EVENT and msg.get("event") == "loader/add_plugin_install_prompt":
-                m_args = msg.get("args", [])
+            if event == "loader/add_plugin_install_prompt":
                 if len(m_args) < 3:
                     print("\r" + " " * 30 + "\r", end="", file=sys.stderr, flush=True)
                     log(f"Invalid install prompt args: {m_args}")
@@ -254,17 +389,16 @@ async def run_installer(target_id: int, store_url: str) -> None:
                                   [request_id])
                 confirmed = True
 
-            elif m_type == EVENT and msg.get("event") == "loader/plugin_download_info":
-                m_args = msg.get("args", [])
+            elif event == "loader/plugin_download_info":
                 if len(m_args) >= 1:
                     progress = m_args[0]
                     filled = int(20 * progress / 100)
                     bar = "=" * filled + " " * (20 - filled)
                     print(f"\r[{bar}] {progress}%", end="", file=sys.stderr, flush=True)
 
-            elif m_type == EVENT and msg.get("event") == "loader/plugin_download_finish":
+            elif event == "loader/plugin_download_finish":
                 print(f"\r[{'=' * 20}] 100%", file=sys.stderr)
-                log(f"Installation successful: {msg.get('args')}")
+                log(f"Installation successful: {m_args}")
                 installation_finished = True
                 success = True
                 # if already confirmed, we expect a REPLY after this event, 
@@ -272,9 +406,9 @@ async def run_installer(target_id: int, store_url: str) -> None:
                 if not confirmed:
                     break
 
-            elif m_type == REPLY and msg.get('result') is not None:
+            elif m_type == REPLY and msg.get("result") is not None:
                 print("\r" + " " * 30 + "\r", end="", file=sys.stderr, flush=True)
-                log(f"Server reply: {msg.get('result')}")
+                log(f"Server reply: {msg['result']}")
                 if installation_finished:
                     break
 
@@ -286,7 +420,13 @@ async def run_installer(target_id: int, store_url: str) -> None:
         log(f"Error: {e}")
         error = e
     finally:
-        await client.close()
+        # Cancelling would not stop the worker thread, so wait for the download
+        # to finish and retrieve its outcome if it was never consumed
+        if store_task is not None:
+            with contextlib.suppress(Exception):
+                await store_task
+        if own_client:
+            await client.close()
 
     if error:
         raise error
@@ -294,13 +434,14 @@ async def run_installer(target_id: int, store_url: str) -> None:
         raise RuntimeError("Installation did not complete successfully")
 
 
-async def configure_store_url(store_url: str) -> None:
+async def configure_store_url(store_url: str,
+                              client: Optional[DeckyClient] = None) -> None:
     """Configure custom store URL in Decky settings."""
-    client = DeckyClient()
+    own_client = client is None
+    if own_client:
+        client = DeckyClient()
     try:
-        log(f"Connecting to Decky server at {client.host}:{client.port}...")
-        token = await client.get_token()
-        await client.connect(token)
+        await client.open()
 
         # First, set the store type to 2 (custom)
         log(f"Setting store type to custom (2)...")
@@ -333,16 +474,17 @@ async def configure_store_url(store_url: str) -> None:
         log(f"Error: {e}")
         raise
     finally:
-        await client.close()
+        if own_client:
+            await client.close()
 
 
-async def get_store_url() -> str:
+async def get_store_url(client: Optional[DeckyClient] = None) -> str:
     """Get the configured custom store URL and type from Decky settings."""
-    client = DeckyClient()
+    own_client = client is None
+    if own_client:
+        client = DeckyClient()
     try:
-        log(f"Connecting to Decky server at {client.host}:{client.port}...")
-        token = await client.get_token()
-        await client.connect(token)
+        await client.open()
 
         # Get store type
         log("Getting configured store type...")
@@ -383,6 +525,23 @@ async def get_store_url() -> str:
     except Exception as e:
         log(f"Error: {e}")
         raise
+    finally:
+        if own_client:
+            await client.close()
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Run the requested command, sharing one Decky connection between steps."""
+    client = DeckyClient()
+    try:
+        if args.command == "install":
+            if args.configure_store:
+                await configure_store_url(args.configure_store, client)
+            await run_installer(args.target_id, args.store_url, client)
+        elif args.command == "configure-store":
+            await configure_store_url(args.url, client)
+        elif args.command == "get-store":
+            await get_store_url(client)
     finally:
         await client.close()
 
@@ -410,6 +569,11 @@ if __name__ == "__main__":
         default=42,
         help="Plugin ID to install (default: 42)"
     )
+    install_parser.add_argument(
+        "--configure-store",
+        metavar="URL",
+        help="Configure this custom store URL first, over the same connection"
+    )
 
     # Configure store subcommand
     config_parser = subparsers.add_parser(
@@ -429,16 +593,14 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    # Execute based on subcommand
-    if args.command == "install":
-        asyncio.run(run_installer(
-            target_id=args.target_id,
-            store_url=args.store_url
-        ))
-    elif args.command == "configure-store":
-        asyncio.run(configure_store_url(args.url))
-    elif args.command == "get-store":
-        asyncio.run(get_store_url())
-    else:
+    if args.command is None:
         parser.print_help()
         sys.exit(1)
+
+    if uvloop is not None and hasattr(uvloop, "run"):
+        uvloop.run(main(args))
+    else:
+        if uvloop is not None:
+            # uvloop < 0.18 has no run(); select it through the loop policy
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        asyncio.run(main(args))
@@ -114,7 +114,7 @@ def ws_recv_frame(sock: socket.socket) -> tuple[int, bytes]:
     payload = recv_exact(sock, length) if length else b""
     
     if masked:
-        payload = bytes(b ^ mask_key[i % 4] for i, b in enumerate(payload))
+        payload = bytes(b ^ mask_key[i & 3] for i, b in enumerate(payload))
 
     return opcode, payload
 
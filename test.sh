@@ -9,3 +9,5 @@ echo "Mock Decky Server is running. Logs are being written to /tmp/mock_decky_se
 trap "kill $server_pid" EXIT
 
 python3 decky_client.py install
+python3 decky_client.py install --configure-store http://127.0.0.1:1337/plugins
+python3 decky_client.py get-store
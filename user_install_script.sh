@@ -69,11 +69,10 @@ if ! (cd /tmp && sha256sum -c decky_client.py.sha256); then
   exit 1
 fi
 
-# Configure the custom store URL first to ensure install requests go to the correct store
-python3 "${decky_client}" configure-store "https://${DECKY_PLUGIN_MIRROR_HOST}/plugins"
-
-# Install the plugin
+# Configure the custom store URL first to ensure install requests go to the correct store,
+# then install the plugin over the same Decky connection
 python3 "${decky_client}" install \
+  --configure-store "https://${DECKY_PLUGIN_MIRROR_HOST}/plugins" \
   --store-url "https://${DECKY_PLUGIN_MIRROR_HOST}/plugins" \
   --target-id "${DECKY_PLUGIN_TARGET_ID}"
 